@@ -1,5 +1,13 @@
+from .calibration import *
 from .configuration import *
 from .detector import *
 from .recorder import *
 from .discord_bot import *
+from .live_view import *
+from .messenger import *
+from .pacing import *
+from .profiler import *
+from .staging import *
+from .summary import *
+from .supervisor import *
 from .utils import *
\ No newline at end of file
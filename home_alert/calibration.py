@@ -0,0 +1,169 @@
+from collections import deque
+import math
+import time
+
+import cv2
+import numpy as np
+
+
+#  Percentile of the noise used as the base of the proposed thresholds.
+CALIBRATION_PERCENTILE: float = 99.9
+#  The proposed alert threshold is the noise level of the window scores multiplied by this margin.
+CALIBRATION_ALERT_MARGIN: float = 2.0
+#  Lowest alert threshold proposed, so a perfectly still scene does not make every single changed pixel an alert.
+CALIBRATION_MIN_ALERT_THRESHOLD: int = 5
+CALIBRATION_SCORE_BINS: int = 1024
+#  Shortest calibration accepted, and least frames needed in each half for the proposed thresholds to be meaningful.
+CALIBRATION_MIN_SECONDS: int = 10
+CALIBRATION_MIN_SAMPLES: int = 20
+#  Seconds past the calibration duration after which a calibration still waiting for frames (e.g. a degraded camera) is abandoned.
+CALIBRATION_TIMEOUT_MARGIN: int = 30
+
+
+class StreamingStats:
+
+    def __init__(self, bins: int, max_value: float) -> None:
+        '''Streaming mean and variance (Welford) with percentiles estimated from a fixed-size histogram of values in [0, `max_value`].'''
+
+        self.bins: int = bins
+        self.max_value: float = max_value
+        self.bin_width: float = max_value / bins
+        self.histogram: np.ndarray = np.zeros(bins, dtype=np.int64)
+        self.count: int = 0
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        self.max: float = 0.0
+
+
+    def add(self, value: float) -> None:
+        '''Adds a single value.'''
+
+        self.count += 1
+        delta: float = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.max = max(self.max, value)
+        self.histogram[min(int(value / self.bin_width), self.bins - 1)] += 1
+
+
+    def add_counts(self, counts: np.ndarray) -> None:
+        '''Adds a batch of integer values given as counts per value, e.g. `np.bincount` of an image.
+        Requires one bin per integer value (`bins == max_value`). The batch is merged with Chan's parallel update.
+        '''
+
+        batch_count: int = int(counts.sum())
+        if batch_count == 0:
+            return
+
+        values: np.ndarray = np.arange(len(counts))
+        batch_mean: float = float((values * counts).sum() / batch_count)
+        batch_m2: float = float((counts * (values - batch_mean) ** 2).sum())
+
+        total: int = self.count + batch_count
+        delta: float = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self.m2 += batch_m2 + delta ** 2 * self.count * batch_count / total
+        self.count = total
+        self.max = max(self.max, float(np.flatnonzero(counts)[-1]))
+        self.histogram[:len(counts)] += counts
+
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+    def percentile(self, percent: float) -> float:
+        '''Returns the upper edge of the histogram bin containing the `percent` percentile, an upper estimate.'''
+
+        if self.count == 0:
+            return 0.0
+        cumulative: np.ndarray = np.cumsum(self.histogram)
+        index: int = int(np.searchsorted(cumulative, self.count * percent / 100))
+        return min((index + 1) * self.bin_width, self.max_value)
+
+
+class Calibration:
+
+    def __init__(self, seconds: int, frames_for_alert: int, apply: bool = False) -> None:
+        '''Calibration Class that collects noise statistics from the Detector on an empty scene and proposes thresholds.
+        During the first half the differences of individual pixels are collected to propose the detector threshold,
+        during the second half the window scores (as used for the alert) are collected using the proposed detector threshold.
+        '''
+
+        self.seconds: int = seconds
+        self.apply: bool = apply
+        self.created: float = time.monotonic()
+        self.started: float|None = None
+        self.finished: bool = False
+        self.frames: int = 0
+        self.pixel_frames: int = 0
+
+        self.pixel_stats: StreamingStats = StreamingStats(256, 256)
+        self.score_stats: StreamingStats = StreamingStats(CALIBRATION_SCORE_BINS, 255 * frames_for_alert)
+        self.window: deque[float] = deque(maxlen=frames_for_alert)
+        self.detector_threshold: int|None = None
+        self.alert_threshold: int|None = None
+
+
+    def add_difference(self, difference: cv2.typing.MatLike) -> None:
+        '''Adds the absolute difference between two consecutive preprocessed Detector frames.'''
+
+        if self.finished:
+            return
+
+        now: float = time.monotonic()
+        if self.started is None:
+            self.started = now
+        self.frames += 1
+
+        if now - self.started < self.seconds / 2:
+            self.pixel_stats.add_counts(np.bincount(difference.ravel(), minlength=256))
+            self.pixel_frames += 1
+            return
+
+        if self.detector_threshold is None:
+            self.detector_threshold = min(255, max(1, math.ceil(self.pixel_stats.percentile(CALIBRATION_PERCENTILE))))
+
+        threshold: cv2.typing.MatLike = cv2.threshold(difference, self.detector_threshold, 255, cv2.THRESH_BINARY)[1]
+        self.window.append(threshold.mean())
+        if len(self.window) == self.window.maxlen:
+            self.score_stats.add(sum(self.window))
+
+        if now - self.started >= self.seconds:
+            self.finished = True
+            if not self.enough_samples:
+                self.detector_threshold = None
+                return
+            noise: float = max(self.score_stats.percentile(CALIBRATION_PERCENTILE), self.score_stats.mean + 4 * self.score_stats.std)
+            self.alert_threshold = max(CALIBRATION_MIN_ALERT_THRESHOLD, math.ceil(noise * CALIBRATION_ALERT_MARGIN))
+
+
+    def timed_out(self) -> bool:
+        '''Returns whether the calibration has not finished well past its duration, as frames stopped arriving.'''
+
+        return not self.finished and time.monotonic() - self.created > self.seconds + CALIBRATION_TIMEOUT_MARGIN
+
+
+    @property
+    def enough_samples(self) -> bool:
+        '''Whether both halves collected enough frames for thresholds to be proposed.'''
+
+        return self.pixel_frames >= CALIBRATION_MIN_SAMPLES and self.score_stats.count >= CALIBRATION_MIN_SAMPLES
+
+
+    def report(self) -> str:
+        '''Returns a summary of the collected statistics and the proposed thresholds.'''
+
+        if not self.enough_samples:
+            return f'''`Frames: {self.frames}`\r
+`Not enough samples: {self.pixel_frames} pixel difference frames and {self.score_stats.count} window scores collected, \
+at least {CALIBRATION_MIN_SAMPLES} of each needed. No thresholds proposed, try a longer calibration.`'''
+
+        return f'''`Frames: {self.frames}`\r
+`Pixel difference: mean {self.pixel_stats.mean:.2f}, std {self.pixel_stats.std:.2f}, \
+{CALIBRATION_PERCENTILE}th percentile {self.pixel_stats.percentile(CALIBRATION_PERCENTILE):.0f}, max {self.pixel_stats.max:.0f}`\r
+`Window score: mean {self.score_stats.mean:.2f}, std {self.score_stats.std:.2f}, \
+{CALIBRATION_PERCENTILE}th percentile {self.score_stats.percentile(CALIBRATION_PERCENTILE):.2f}, max {self.score_stats.max:.2f}`\r
+`Proposed detector threshold: {self.detector_threshold}`\r
+`Proposed alert threshold: {self.alert_threshold}`'''
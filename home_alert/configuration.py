@@ -1,6 +1,8 @@
 import json
 from pathlib import Path
 
+from .calibration import Calibration
+
 class Config():
 
     def __init__(self, config_path: Path, cam: int = 0) -> None:
@@ -19,10 +21,18 @@ class Config():
         self.recorder_frame_width: int = 1280
         self.recorder_frame_height: int = 720
         self.recorder_frame_rate: int = 30
+        self.recorder_pacing: bool = True
+        self.chunk_seconds: int = 0
+        self.summary: bool = True
+        self.summary_motion_threshold: float = 2.0
+        self.summary_frame_step: int = 5
+        self.summary_frame_width: int = 320
+        self.summary_frame_rate: int = 10
 
         try:
             with open(config_path, 'r') as f:
-                self.__dict__ = json.load(f)[str(cam)]
+                #  Update instead of replacing, so settings missing from older configuration files keep their default values.
+                self.__dict__.update(json.load(f)[str(cam)])
         except (FileNotFoundError, json.decoder.JSONDecodeError):
             print("Configuration file not found or corrupted. Creating with default values...")
             self._dump_config(config_path)
@@ -30,6 +40,9 @@ class Config():
         self.cam: int = cam
         self.recording: bool = False
         self.kill: bool = False
+        self.calibration: Calibration|None = None
+        self.degraded: bool = False
+        self.reconnect_attempts: int = 0
 
 
     def _dump_config(self, config_path: Path) -> None:
@@ -5,16 +5,23 @@ import time
 
 import cv2
 
+from .calibration import Calibration
 from .configuration import Config
+from .live_view import FrameBroadcaster
+from .profiler import PROFILER
+from .supervisor import CameraSupervisor
 
 
 class Detector:
 
-    def __init__(self, cam: int, config: Config) -> None:
+    def __init__(self, cam: int, config: Config, broadcaster: FrameBroadcaster|None = None, 
+                 supervisor: CameraSupervisor|None = None) -> None:
         '''Detector Class that represents the movement detector component of the application.'''
 
         self.cam: int = cam
         self.config: Config = config
+        self.broadcaster: FrameBroadcaster|None = broadcaster
+        self.supervisor: CameraSupervisor = supervisor if supervisor is not None else CameraSupervisor(cam, config)
         self.logger: logging.Logger = logging.getLogger(__name__)
         self.bad_frames_counter: int = 5
         self.previous_frame: cv2.typing.MatLike|None = None
@@ -30,52 +37,94 @@ class Detector:
         self.det.set(cv2.CAP_PROP_FPS, self.config.detector_frame_rate)
 
 
+    def _release_detector(self) -> None:
+        '''Releases the Video Capture object and resets the detector state.'''
+
+        self.det.release()
+        self.previous_frame = None
+        self.thresh_mean_queue = deque(maxlen=self.config.frames_for_alert)
+        if self.config.debug:
+            try:
+                cv2.destroyWindow(f'det-{self.cam}')
+            except cv2.error:
+                pass
+
+
     def _detector_loop(self) -> None:
         '''Detector component logic loop.'''
 
         while True:
             if self.config.kill:
                 break
-            if not self.config.detecting:
+            calibration: Calibration|None = self.config.calibration
+            calibrating: bool = calibration is not None and not calibration.finished
+            if not self.config.detecting and not calibrating:
+                if self.det.isOpened():
+                    #  E.g. a calibration abandoned by the Discord bot after timing out.
+                    self._release_detector()
                 time.sleep(0.5)
                 continue
+            if not self.supervisor.can_reconnect():
+                time.sleep(0.1)
+                continue
 
             if not self.det.isOpened():
                 self._make_detector()
-            ret, frame = self.det.read()
+            with PROFILER.stage("capture"):
+                ret, frame = self.det.read()
 
             if not ret:
                 if self.config.debug:
                     print(f'Detector {self.cam}: No frame received!')
                 if self.bad_frames_counter <= 0:
                     self.logger.error(f'Detector {self.cam}: No frames received.')
-                    self.config.kill = True
+                    self._release_detector()
+                    self.bad_frames_counter = 5
+                    self.supervisor.connection_lost(f'Detector {self.cam}')
                 else:
                     self.bad_frames_counter -= 1
                 continue
             elif ret and self.bad_frames_counter < 5:
                 self.bad_frames_counter += 1
+            self.supervisor.connection_restored(f'Detector {self.cam}')
+
+            if self.broadcaster is not None:
+                with PROFILER.stage("live_view"):
+                    self.broadcaster.publish(frame)
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            frame = cv2.GaussianBlur(frame, (21,21), 0)
+            with PROFILER.stage("preprocess"):
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                frame = cv2.GaussianBlur(frame, (21,21), 0)
 
             if type(self.previous_frame) == type(None):
                 self.previous_frame = frame
                 continue
                 
-            difference: cv2.typing.MatLike = cv2.absdiff(frame, self.previous_frame)
-            threshold: cv2.typing.MatLike = cv2.threshold(difference, self.config.detector_threshold, 255, cv2.THRESH_BINARY)[1]
-
-            self.thresh_mean_queue.append(threshold.mean())
+            with PROFILER.stage("diff"):
+                difference: cv2.typing.MatLike = cv2.absdiff(frame, self.previous_frame)
+                if not calibrating:
+                    threshold: cv2.typing.MatLike = cv2.threshold(difference, self.config.detector_threshold, 255, cv2.THRESH_BINARY)[1]
+                    self.thresh_mean_queue.append(threshold.mean())
+
+            if calibrating:
+                #  Alerts are suppressed while calibrating, the scene is expected to be empty.
+                calibration.add_difference(difference)
+                self.previous_frame = frame
+                if calibration.finished:
+                    self.thresh_mean_queue.clear()
+                    if not self.config.detecting:
+                        self._release_detector()
+                continue
 
             if self.config.debug:
                 cur_date: datetime.datetime = datetime.datetime.now()
                 cur_date_str: str = cur_date.strftime("%Y/%m/%d %H:%M:%S.%f")[:-3]
                 if sum(self.thresh_mean_queue):
                     print(f'[{cur_date_str}] Detector {self.cam} threshold: {sum(self.thresh_mean_queue):.2f}')
-                cv2.putText(threshold, cur_date_str, (20, 20), cv2.FONT_HERSHEY_PLAIN, 1.5, (255,0,0), 1, cv2.LINE_AA)
-                cv2.imshow(f'det-{self.cam}', threshold)
-                cv2.waitKey(1)
+                with PROFILER.stage("overlay"):
+                    cv2.putText(threshold, cur_date_str, (20, 20), cv2.FONT_HERSHEY_PLAIN, 1.5, (255,0,0), 1, cv2.LINE_AA)
+                    cv2.imshow(f'det-{self.cam}', threshold)
+                    cv2.waitKey(1)
 
             self.previous_frame = frame
 
@@ -85,14 +134,8 @@ class Detector:
                 self.logger.info(f'Detector {self.cam} alert triggered, starting recording.')
 
             if not self.config.detecting:
-                self.det.release()
-                self.previous_frame = None
-                self.thresh_mean_queue = deque(maxlen=self.config.frames_for_alert)
+                self._release_detector()
                 if self.config.debug:
-                    try:
-                        cv2.destroyWindow(f'det-{self.cam}')
-                    except cv2.error:
-                        pass
                     print(f'Camera {self.cam} alert triggered, starting recording.')
 
 
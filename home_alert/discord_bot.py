@@ -1,6 +1,7 @@
 import asyncio
 from collections import deque
 from functools import wraps
+import io
 import logging
 import os
 from pathlib import Path
@@ -9,28 +10,37 @@ import discord
 from discord.ext import tasks
 from dotenv import load_dotenv
 
+from .calibration import Calibration, CALIBRATION_MIN_SECONDS
 from .configuration import Config
+from .messenger import MessageScheduler, Priority
+from .profiler import PROFILER
+from .staging import SegmentStager
 from .utils import DISCORD_HELP
 
 
 class DiscordBot:
 
-    def __init__(self, recording_dir_path: Path, cameras: int, configs: list[Config], recordings_queue: deque[str]) -> None:
+    def __init__(self, recording_dir_path: Path, cameras: int, configs: list[Config], recordings_queue: deque[str],
+                 stager: SegmentStager|None = None) -> None:
         '''DiscordBot Class that represents the Discord bot component of the application.'''
 
         self.recording_dir_path: Path = recording_dir_path
         self.cameras: int = cameras
         self.configs: list[Config] = configs
         self.recordings_queue: deque[str] = recordings_queue
+        self.stager: SegmentStager|None = stager
 
         self.logger: logging.Logger = logging.getLogger(__name__)
         self.kill: bool = False
+        self.messenger: MessageScheduler = MessageScheduler()
+        self.upload_task: asyncio.Task|None = None
 
         try:
             self.uploaded_rec_path: Path = recording_dir_path / "uploaded"
             self.uploaded_rec_path.mkdir(exist_ok=True)
 
             self.notified_alert: list[bool] = [False for _ in self.configs]
+            self.notified_degraded: list[bool] = [False for _ in self.configs]
 
             self.intents: discord.Intents = discord.Intents.default()
             self.intents.messages = True
@@ -70,6 +80,12 @@ class DiscordBot:
                 await asyncio.sleep(1)
 
             
+    def send_status(self, content: str, priority: Priority = Priority.REPLY) -> asyncio.Future:
+        '''Queues a message for the `status-control` Discord channel. Returns a future that can be awaited for delivery.'''
+
+        return self.messenger.submit(self.status_control_channel, content, priority)
+
+
     async def clear_channel(self) -> None:
         '''Asynchronous deleting all messages in the `status-control` Discord channel.'''
 
@@ -80,7 +96,7 @@ class DiscordBot:
             if messages:
                 await self.status_control_channel.delete_messages(messages)
             else:
-                await self.status_control_channel.send(f'{msg_counter} message(s) deleted.')
+                self.send_status(f'{msg_counter} message(s) deleted.')
                 break
 
     
@@ -93,22 +109,59 @@ class DiscordBot:
                     guild: discord.Guild = self.client.get_guild(self.guild_id)
                     self.ping_role = discord.utils.get(guild.roles, name="Admin")
                 if not self.notified_alert[index]:
-                    await self.status_control_channel.send(f'{self.ping_role.mention} Alert triggered for camera {config.cam}!')
+                    self.send_status(f'{self.ping_role.mention} Alert triggered for camera {config.cam}!', Priority.ALERT)
                     self.notified_alert[index] = True
 
 
+    async def check_camera_health(self) -> None:
+        '''Asynchronous checking if any camera stopped responding or reconnected, sending Discord notification once for each change.'''
+
+        for index, config in enumerate(self.configs):
+            if config.degraded and not self.notified_degraded[index]:
+                self.send_status(f'Camera {config.cam} is not responding, reconnecting in the background.', Priority.ALERT)
+                self.notified_degraded[index] = True
+            elif not config.degraded and self.notified_degraded[index]:
+                self.send_status(f'Camera {config.cam} reconnected.')
+                self.notified_degraded[index] = False
+
+
     async def check_files_upload(self) -> None:
-        '''Asynchronous checking if files are available to upload, attaching them and sending message to appropriate Discord channel,
-        and moving them to `uploaded` directory once finished.
+        '''Asynchronous checking if files are available to upload, starting the upload of the next file as a separate task
+        once the previous upload has finished, so the tasks loop is never held back by an upload in progress.
+        '''
+
+        if self.recordings_queue and (self.upload_task is None or self.upload_task.done()):
+            self.upload_task = asyncio.create_task(self.upload_file(self.recordings_queue.popleft()))
+
+
+    async def upload_file(self, filename: str) -> None:
+        '''Asynchronous attaching a file and sending message to appropriate Discord channel, and moving it to `uploaded` directory once finished.
+        Staged files are uploaded straight from the staging directory and persisted to durable storage
+        in a worker thread afterwards, or to the `recordings` directory if the upload fails.
         '''
 
-        if self.recordings_queue:
-            file_path: Path = self.recording_dir_path / self.recordings_queue.popleft()
-            filename: str = file_path.name
-            camera, timestamp = filename.split(".")[0].split("-")
+        try:
+            staged: bool = self.stager is not None and self.stager.is_staged(filename)
+            file_path: Path = self.stager.locate(filename) if staged else self.recording_dir_path / filename
+            #  `camera id-timestamp[-counter][-summary]`, the counter only for segments started within the same second.
+            camera, timestamp, *rest = filename.split(".")[0].split("-")
+            content: str = f'<t:{timestamp}:f> motion summary' if "summary" in rest else f'<t:{timestamp}:f>'
             file_to_attach: discord.File = discord.File(file_path)
-            await self.cam_rec_channels[int(camera)].send(content=f'<t:{timestamp}:f>' , file=file_to_attach)
-            file_path.rename(self.uploaded_rec_path / filename)
+            try:
+                await self.messenger.submit(self.cam_rec_channels[int(camera)], content=content, file=file_to_attach)
+            except Exception:
+                if staged:
+                    await asyncio.to_thread(self.stager.persist, filename, self.recording_dir_path)
+                raise
+            if staged:
+                await asyncio.to_thread(self.stager.persist, filename, self.uploaded_rec_path)
+            else:
+                file_path.rename(self.uploaded_rec_path / filename)
+        except Exception as e:
+            #  Not awaited by the tasks loop, so errors are reported here.
+            self.logger.exception(e)
+            if self.status_control_channel is not None:
+                self.send_status(f'Error: {type(e).__name__}, {str(e)}\rFor more information please check the log file.')
 
 
     async def killswitch_check(self) -> None:
@@ -116,7 +169,8 @@ class DiscordBot:
 
         if self.kill:
             if self.status_control_channel is not None:
-                await self.status_control_channel.send("Closing application, see you later!")
+                await self.send_status("Closing application, see you later!")
+            self.messenger.stop()
             await self.client.close()
 
 
@@ -126,10 +180,11 @@ class DiscordBot:
         message: str = "# Status\r"
         for config in self.configs:
             message = f'''{message}## Camera {config.cam}:\r`Detecting: {config.detecting}`\r
-`Recording: {config.recording}`\r`Detector threshold: {config.detector_threshold}`\r
+`Recording: {config.recording}`\r`Degraded: {config.degraded} ({config.reconnect_attempts} reconnection attempts)`\r
+`Detector threshold: {config.detector_threshold}`\r
 `Alert threshold: {config.alert_threshold}`\r'''
             
-        await self.status_control_channel.send(message[:-1])
+        self.send_status(message[:-1])
 
 
     async def start_detecting(self) -> None:
@@ -139,10 +194,10 @@ class DiscordBot:
 
         for config in self.configs:
             if config.detecting:
-                await self.status_control_channel.send(f'Camera {config.cam} already detecting.')
+                self.send_status(f'Camera {config.cam} already detecting.')
             else:
                 config.detecting = True
-                await self.status_control_channel.send(f'Camera {config.cam} now detecting.')
+                self.send_status(f'Camera {config.cam} now detecting.')
 
 
     async def stop_detecting(self) -> None:
@@ -152,10 +207,10 @@ class DiscordBot:
 
         for config in self.configs:
             if not config.detecting:
-                await self.status_control_channel.send(f'Camera {config.cam} already not detecting.')
+                self.send_status(f'Camera {config.cam} already not detecting.')
             else:
                 config.detecting = False
-                await self.status_control_channel.send(f'Camera {config.cam} now not detecting.')
+                self.send_status(f'Camera {config.cam} now not detecting.')
 
 
     async def stop_recording(self) -> None:
@@ -168,7 +223,7 @@ class DiscordBot:
             if config.recording:
                 config.recording = False
                 config.detecting = True
-                await self.status_control_channel.send(f'Recording stopped for camera {config.cam}, now detecting.')
+                self.send_status(f'Recording stopped for camera {config.cam}, now detecting.')
             self.notified_alert = [False for _ in self.configs]
     
 
@@ -183,7 +238,7 @@ class DiscordBot:
             config.recording = False
             config.detecting = False
 
-        await self.status_control_channel.send("All cameras stopped detecting and recording, now on standby.")
+        self.send_status("All cameras stopped detecting and recording, now on standby.")
 
 
     async def set_detector_threshold(self, message_content: str) -> None:
@@ -192,7 +247,7 @@ class DiscordBot:
         '''
 
         if len((message_parts := message_content.split(" "))) != 3:
-            self.status_control_channel.send("Command not recognized, type `!help` for a list of commands.")
+            self.send_status("Command not recognized, type `!help` for a list of commands.")
             return
         
         cam = int(message_parts[1])
@@ -200,7 +255,7 @@ class DiscordBot:
         
         self.configs[cam].detector_threshold = detector_threshold
 
-        await self.status_control_channel.send(f'Detector threshold for camera {cam} set to {detector_threshold}.')
+        self.send_status(f'Detector threshold for camera {cam} set to {detector_threshold}.')
 
 
     async def set_alert_threshold(self, message_content: str) -> None:
@@ -209,7 +264,7 @@ class DiscordBot:
         '''
 
         if len((message_parts := message_content.split(" "))) != 3:
-            self.status_control_channel.send("Command not recognized, type `!help` for a list of commands.")
+            self.send_status("Command not recognized, type `!help` for a list of commands.")
             return
         
         cam = int(message_parts[1])
@@ -217,7 +272,83 @@ class DiscordBot:
         
         self.configs[cam].alert_threshold = alert_threshold
 
-        await self.status_control_channel.send(f'Detector threshold for camera {cam} set to {alert_threshold}.')
+        self.send_status(f'Detector threshold for camera {cam} set to {alert_threshold}.')
+
+
+    async def calibrate(self, message_content: str) -> None:
+        '''Starts collecting noise statistics for the specified camera, in order to propose new threshold values.
+        Camera and duration in seconds specified in `message_content`, optionally followed by `apply` to apply the proposed values.
+        '''
+
+        message_parts: list[str] = message_content.split(" ")
+        if len(message_parts) not in (3, 4) or (len(message_parts) == 4 and message_parts[3] != "apply"):
+            self.send_status("Command not recognized, type `!help` for a list of commands.")
+            return
+
+        cam = int(message_parts[1])
+        seconds = int(message_parts[2])
+        config: Config = self.configs[cam]
+
+        if seconds < CALIBRATION_MIN_SECONDS:
+            self.send_status(f'Calibration needs at least {CALIBRATION_MIN_SECONDS} seconds.')
+            return
+
+        if config.recording:
+            self.send_status(f'Camera {cam} is recording, stop recording before calibrating.')
+            return
+        if config.calibration is not None:
+            self.send_status(f'Camera {cam} is already calibrating.')
+            return
+
+        config.calibration = Calibration(seconds, config.frames_for_alert, apply=len(message_parts) == 4)
+        self.send_status(f'Calibrating camera {cam} for {seconds} seconds, please keep the scene empty.')
+
+
+    async def check_calibration_report(self) -> None:
+        '''Asynchronous checking if any calibration has finished, sending the results and applying the proposed values if requested.
+        Calibrations not finished well past their duration are abandoned, so a camera that stopped responding cannot block further calibrations.
+        '''
+
+        for config in self.configs:
+            calibration: Calibration|None = config.calibration
+            if calibration is None:
+                continue
+            if calibration.timed_out():
+                #  Stops the Detector from adding frames, in case the camera recovers.
+                calibration.finished = True
+                config.calibration = None
+                self.send_status(f'Calibration for camera {config.cam} timed out after receiving {calibration.frames} frames. \
+Please check the camera and try again.')
+                continue
+            if not calibration.finished:
+                continue
+
+            message: str = f'## Calibration for camera {config.cam} finished:\r{calibration.report()}\r'
+            if not calibration.enough_samples:
+                message = f'{message}Current thresholds kept: `detector {config.detector_threshold}`, `alert {config.alert_threshold}`.'
+            elif calibration.apply:
+                config.detector_threshold = calibration.detector_threshold
+                config.alert_threshold = calibration.alert_threshold
+                message = f'{message}Proposed thresholds applied.'
+            else:
+                message = f'''{message}Current thresholds: `detector {config.detector_threshold}`, `alert {config.alert_threshold}`. \
+Use `!setdetectorthreshold` and `!setalertthreshold` to apply them.'''
+            config.calibration = None
+            self.send_status(message)
+
+
+    async def profile_report(self) -> None:
+        '''Sends message to the status-control channel with the profiler summary table,
+        attaching the sampled stacks in collapsed (flamegraph) format.
+        '''
+
+        if not PROFILER.enabled:
+            self.send_status("Profiler not enabled, start the application with the `--profile` option.")
+            return
+
+        collapsed: discord.File = discord.File(io.BytesIO(PROFILER.collapsed().encode()), filename="profile.collapsed")
+        #  Keep within the Discord message length limit.
+        self.messenger.submit(self.status_control_channel, f'```{PROFILER.summary()[:1900]}```', file=collapsed)
 
 
     async def check_log(self, message_content: str) -> None:
@@ -225,7 +356,7 @@ class DiscordBot:
         Amount of lines is specified by the user in `message_content`.'''
 
         if len((message_parts := message_content.split(" "))) != 2:
-            self.status_control_channel.send("Command not recognized, type `!help` for a list of commands.")
+            self.send_status("Command not recognized, type `!help` for a list of commands.")
             return
         
         lines = int(message_parts[1])
@@ -234,7 +365,7 @@ class DiscordBot:
         with open(log_handler.baseFilename) as f:
             log_content: list[str] = f.readlines()
             log_to_return: str = "".join(log_content[-lines:])
-        await self.status_control_channel.send(f'```{log_to_return}```')
+        self.send_status(f'```{log_to_return}```')
 
 
     def run_bot(self) -> None:
@@ -249,14 +380,15 @@ class DiscordBot:
                     self.logger.exception(e)
                     if self.status_control_channel is not None:
                         message = f'Error: {type(e).__name__}, {str(e)}\rFor more information please check the log file.'
-                        await self.status_control_channel.send(message)
+                        self.send_status(message)
             return wrapper
         
         @tasks.loop(seconds=1)
         @exception_handler_async
         async def tasks_loop() -> None:
 
-            await asyncio.gather(self.check_files_upload(), self.check_notification_send(), self.killswitch_check())
+            await asyncio.gather(self.check_files_upload(), self.check_notification_send(), self.check_calibration_report(), 
+                                 self.check_camera_health(), self.killswitch_check())
 
 
         @self.client.event
@@ -272,7 +404,7 @@ class DiscordBot:
             # print(message.content)
             
             if message.content.lower() == "!help":
-                await self.status_control_channel.send(DISCORD_HELP)
+                self.send_status(DISCORD_HELP)
             elif message.content.lower() == "!status":
                 await self.status_report()
             elif message.content.lower() == "!close":
@@ -289,12 +421,16 @@ class DiscordBot:
                 await self.set_detector_threshold(message.content.lower())
             elif message.content.lower().startswith("!setalertthreshold"):
                 await self.set_alert_threshold(message.content.lower())
+            elif message.content.lower().startswith("!calibrate"):
+                await self.calibrate(message.content.lower())
             elif message.content.lower().startswith("!checklog"):
                 await self.check_log(message.content.lower())
+            elif message.content.lower() == "!profile":
+                await self.profile_report()
             elif message.content.lower() == "!clear":
                 await self.clear_channel()
             else:
-                await self.status_control_channel.send("Command not recognized, type `!help` for a list of commands.")
+                self.send_status("Command not recognized, type `!help` for a list of commands.")
 
         @self.client.event
         @exception_handler_async
@@ -302,7 +438,7 @@ class DiscordBot:
 
             await self.get_channels()
             self.logger.info("Discord bot online.")
-            await self.status_control_channel.send("Home alert is online! Type `!help` for a list of available commands.")
+            self.send_status("Home alert is online! Type `!help` for a list of available commands.", Priority.CHATTER)
             await tasks_loop.start()
 
         try:
@@ -0,0 +1,152 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+import time
+
+import cv2
+
+
+class FrameBroadcaster:
+
+    def __init__(self, cam: int, max_frame_rate: int = 5, jpeg_quality: int = 70) -> None:
+        '''FrameBroadcaster Class that encodes camera frames to JPEG once and shares the same bytes with all live viewers.
+        Frames are only encoded while at least one viewer is connected, at most `max_frame_rate` times per second.
+        '''
+
+        self.cam: int = cam
+        self.min_interval: float = 1 / max_frame_rate
+        self.jpeg_quality: int = jpeg_quality
+        self.condition: threading.Condition = threading.Condition()
+        self.jpeg: bytes|None = None
+        self.sequence: int = 0
+        self.viewers: int = 0
+        self.last_publish: float = 0.0
+
+
+    def wants_frame(self) -> bool:
+        '''Returns whether a new frame should be published. Cheap enough to be checked for every captured frame.'''
+
+        return self.viewers > 0 and time.monotonic() - self.last_publish >= self.min_interval
+
+
+    def publish(self, frame: cv2.typing.MatLike) -> None:
+        '''Encodes `frame` and wakes up the viewers, if any viewer is waiting for a new frame.'''
+
+        if not self.wants_frame():
+            return
+
+        self.last_publish = time.monotonic()
+        ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ret:
+            return
+
+        with self.condition:
+            self.jpeg = buffer.tobytes()
+            self.sequence += 1
+            self.condition.notify_all()
+
+
+    def wait_frame(self, last_sequence: int, timeout: float) -> tuple[int, bytes|None]:
+        '''Waits for a frame newer than `last_sequence` and returns its sequence and bytes.
+        Viewers always get the latest frame, so slow viewers skip frames instead of buffering them.
+        '''
+
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > last_sequence, timeout=timeout)
+            if self.sequence > last_sequence:
+                return self.sequence, self.jpeg
+            return last_sequence, None
+
+
+    def add_viewer(self) -> None:
+        with self.condition:
+            self.viewers += 1
+
+
+    def remove_viewer(self) -> None:
+        with self.condition:
+            self.viewers -= 1
+            if self.viewers == 0:
+                self.jpeg = None
+
+
+class LiveViewHandler(BaseHTTPRequestHandler):
+
+    #  Drop viewers that stop reading instead of blocking their thread indefinitely.
+    timeout: int = 10
+
+    def do_GET(self) -> None:
+        '''Serves an index page at `/` and the MJPEG stream of camera `i` at `/cam/i`.'''
+
+        server: LiveViewServer = self.server
+        parts: list[str] = self.path.strip("/").split("/")
+
+        if parts == [""]:
+            links: str = "".join(f'<li><a href="/cam/{cam}">Camera {cam}</a></li>' for cam in range(len(server.broadcasters)))
+            body: bytes = f'<html><body><h1>Home Alert</h1><ul>{links}</ul></body></html>'.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if len(parts) != 2 or parts[0] != "cam" or not parts[1].isdigit() or int(parts[1]) >= len(server.broadcasters):
+            self.send_error(404)
+            return
+
+        broadcaster: FrameBroadcaster = server.broadcasters[int(parts[1])]
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.end_headers()
+
+        broadcaster.add_viewer()
+        try:
+            sequence: int = 0
+            while not server.closing:
+                sequence, jpeg = broadcaster.wait_frame(sequence, timeout=1)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ')
+                self.wfile.write(f'{len(jpeg)}\r\n\r\n'.encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b'\r\n')
+        except (ConnectionError, TimeoutError):
+            pass
+        finally:
+            broadcaster.remove_viewer()
+
+
+    def log_message(self, format: str, *args) -> None:
+        server: LiveViewServer = self.server
+        server.logger.info(f'Live view {self.address_string()}: {format % args}')
+
+
+class LiveViewServer(ThreadingHTTPServer):
+
+    daemon_threads: bool = True
+
+    def __init__(self, host: str, port: int, broadcasters: list[FrameBroadcaster]) -> None:
+        '''LiveViewServer Class that serves the MJPEG live view of each camera over HTTP.'''
+
+        super().__init__((host, port), LiveViewHandler)
+        self.broadcasters: list[FrameBroadcaster] = broadcasters
+        self.closing: bool = False
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.thread: threading.Thread = threading.Thread(target=self.serve_forever, name="live-view")
+
+
+    def start(self) -> None:
+        '''Starts serving in a background thread.'''
+
+        self.thread.start()
+        self.logger.info(f'Live view available at http://{self.server_address[0]}:{self.server_address[1]}/')
+
+
+    def stop(self) -> None:
+        '''Stops serving and disconnects all viewers.'''
+
+        self.closing = True
+        self.shutdown()
+        self.server_close()
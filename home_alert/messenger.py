@@ -0,0 +1,192 @@
+import asyncio
+from enum import IntEnum
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable
+
+from .profiler import PROFILER
+
+
+class Priority(IntEnum):
+    '''Priority of outbound messages, lower values are sent first.'''
+
+    ALERT = 0
+    REPLY = 1
+    CHATTER = 2
+
+
+class OutboundMessage:
+
+    def __init__(self, priority: Priority, sequence: int, content: str, file: Any, future: asyncio.Future) -> None:
+        '''Message waiting in the MessageScheduler queue of a channel.'''
+
+        self.priority: Priority = priority
+        self.sequence: int = sequence
+        self.content: str = content
+        self.file: Any = file
+        self.future: asyncio.Future = future
+
+    def __lt__(self, other: "OutboundMessage") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class RateBudget:
+
+    def __init__(self, rate: int, per: float, clock: Callable[[], float]) -> None:
+        '''Token bucket allowing `rate` messages every `per` seconds.'''
+
+        self.rate: int = rate
+        self.per: float = per
+        self.clock: Callable[[], float] = clock
+        self.tokens: float = rate
+        self.updated: float = clock()
+
+    def _refill(self) -> None:
+        now: float = self.clock()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+
+    def take(self) -> bool:
+        '''Consumes a token if one is available and returns whether it did.'''
+
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        '''Returns the seconds until the next token is available.'''
+
+        self._refill()
+        return max(0.0, (1 - self.tokens) * self.per / self.rate)
+
+
+class MessageScheduler:
+
+    def __init__(self, rate: int = 5, per: float = 5.0, coalesce_delay: float = 0.25, max_length: int = 2000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        '''MessageScheduler Class that queues outbound bot messages per channel, sending alerts before other messages,
+        coalescing queued messages of the same priority into one and keeping each channel within `rate` messages
+        every `per` seconds instead of relying on rate limit retries. Each channel is served by its own task, so
+        a slow upload does not hold back messages to other channels. Channels only need an `id` attribute
+        and an asynchronous `send(content=..., file=...)` method, so a fake client can be used for testing.
+        '''
+
+        self.rate: int = rate
+        self.per: float = per
+        self.coalesce_delay: float = coalesce_delay
+        self.max_length: int = max_length
+        self.clock: Callable[[], float] = clock
+        self.logger: logging.Logger = logging.getLogger(__name__)
+
+        self.channels: dict[int, Any] = {}
+        self.queues: dict[int, list[OutboundMessage]] = {}
+        self.budgets: dict[int, RateBudget] = {}
+        self.wakeups: dict[int, asyncio.Event] = {}
+        self.workers: dict[int, asyncio.Task] = {}
+        self.sequence: itertools.count = itertools.count()
+        self.stopped: bool = False
+
+
+    def submit(self, channel: Any, content: str = "", priority: Priority = Priority.REPLY, file: Any = None) -> asyncio.Future:
+        '''Queues a message for `channel` and returns a future resolved with the sent message.
+        The future can be awaited when delivery matters, or ignored otherwise.
+        '''
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        #  Retrieve exceptions of ignored futures, failures are logged by the scheduler.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        if self.stopped:
+            future.set_exception(RuntimeError("Message scheduler stopped."))
+            return future
+
+        if channel.id not in self.queues:
+            self.channels[channel.id] = channel
+            self.queues[channel.id] = []
+            self.budgets[channel.id] = RateBudget(self.rate, self.per, self.clock)
+            self.wakeups[channel.id] = asyncio.Event()
+            self.workers[channel.id] = loop.create_task(self._channel_worker(channel.id))
+        heapq.heappush(self.queues[channel.id], OutboundMessage(priority, next(self.sequence), content, file, future))
+
+        self.wakeups[channel.id].set()
+        return future
+
+
+    def _next_batch(self, queue: list[OutboundMessage]) -> list[OutboundMessage]:
+        '''Pops the highest priority message and any queued messages of the same priority that can be merged with it.'''
+
+        batch: list[OutboundMessage] = [heapq.heappop(queue)]
+        if batch[0].file is not None:
+            return batch
+
+        length: int = len(batch[0].content)
+        while queue and queue[0].priority == batch[0].priority:
+            if queue[0].file is not None or length + len(queue[0].content) + 1 > self.max_length:
+                break
+            message: OutboundMessage = heapq.heappop(queue)
+            batch.append(message)
+            length += len(message.content) + 1
+
+        return batch
+
+
+    async def _send_batch(self, channel: Any, batch: list[OutboundMessage]) -> None:
+        '''Sends a batch as a single message and resolves the futures of its messages.
+        Only the send itself is timed by the profiler, not the time the messages spent queued.
+        '''
+
+        content: str = "\n".join(message.content for message in batch if message.content)
+        try:
+            if batch[0].file is not None:
+                with PROFILER.stage("upload"):
+                    sent: Any = await channel.send(content=content, file=batch[0].file)
+            else:
+                with PROFILER.stage("send"):
+                    sent: Any = await channel.send(content=content)
+        except Exception as e:
+            self.logger.exception(e)
+            for message in batch:
+                if not message.future.done():
+                    message.future.set_exception(e)
+            return
+
+        for message in batch:
+            if not message.future.done():
+                message.future.set_result(sent)
+
+
+    async def _channel_worker(self, channel_id: int) -> None:
+        '''Sends the queued messages of a channel within its rate budget until the scheduler is stopped.'''
+
+        queue: list[OutboundMessage] = self.queues[channel_id]
+        budget: RateBudget = self.budgets[channel_id]
+        wakeup: asyncio.Event = self.wakeups[channel_id]
+
+        while not self.stopped:
+            await wakeup.wait()
+            wakeup.clear()
+            #  Short delay so messages submitted in the same burst are coalesced.
+            await asyncio.sleep(self.coalesce_delay)
+            while queue and not self.stopped:
+                if budget.take():
+                    await self._send_batch(self.channels[channel_id], self._next_batch(queue))
+                else:
+                    await asyncio.sleep(budget.wait_time())
+
+        for message in queue:
+            if not message.future.done():
+                message.future.cancel()
+        queue.clear()
+
+
+    def stop(self) -> None:
+        '''Signals the channel tasks to finish, cancelling any messages still queued.'''
+
+        self.stopped = True
+        for wakeup in self.wakeups.values():
+            wakeup.set()
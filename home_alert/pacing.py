@@ -0,0 +1,30 @@
+class FramePacer:
+
+    def __init__(self, frame_rate: float, max_gap_seconds: float = 1.0) -> None:
+        '''FramePacer Class that maps frames captured at irregular intervals to a constant frame rate, based on their
+        capture timestamps. Frames arriving faster than the frame rate are dropped and missing frames are filled by
+        repeating the last frame, so recordings play back in real time.
+        Gaps longer than `max_gap_seconds` (e.g. a stalled camera) are only filled up to that length.
+        '''
+
+        self.frame_rate: float = frame_rate
+        self.max_frames_due: int = max(1, int(frame_rate * max_gap_seconds))
+        self.start: float|None = None
+        self.written: int = 0
+
+
+    def frames_due(self, timestamp: float) -> int:
+        '''Returns how many output frames the frame captured at `timestamp` (in seconds) accounts for.
+        `0` means the frame should be dropped, more than `1` means the gap before it should be filled.
+        '''
+
+        if self.start is None:
+            self.start = timestamp
+
+        slot: int = int((timestamp - self.start) * self.frame_rate)
+        due: int = slot + 1 - self.written
+        if due <= 0:
+            return 0
+
+        self.written = slot + 1
+        return min(due, self.max_frames_due)
@@ -0,0 +1,137 @@
+from collections import Counter
+from contextlib import nullcontext
+import datetime
+from pathlib import Path
+import sys
+import threading
+import time
+
+
+class StageTimer:
+
+    def __init__(self, profiler: "Profiler", stage: str) -> None:
+        '''Context manager measuring the time spent in a stage by the current thread.'''
+
+        self.profiler: Profiler = profiler
+        self.stage: str = stage
+        self.start: float = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.profiler.record_stage(threading.current_thread().name, self.stage, time.perf_counter() - self.start)
+
+
+class Profiler:
+
+    def __init__(self, interval: float = 0.01) -> None:
+        '''Profiler Class that samples the stacks of all threads every `interval` seconds and collects explicit stage timings.
+        Disabled by default, in which case `stage` returns a no-op context manager.
+        '''
+
+        self.interval: float = interval
+        self.enabled: bool = False
+        self.started: float = 0.0
+        self.samples: Counter[str] = Counter()
+        self.stages: dict[tuple[str, str], list[float]] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.thread: threading.Thread|None = None
+        self.null_stage: nullcontext = nullcontext()
+
+
+    def start(self) -> None:
+        '''Enables the stage timers and starts the sampling thread.'''
+
+        self.enabled = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+
+
+    def stop(self) -> None:
+        '''Stops the sampling thread and the stage timers.'''
+
+        self.enabled = False
+        if self.thread is not None:
+            self.thread.join()
+
+
+    def stage(self, stage: str) -> StageTimer|nullcontext:
+        '''Returns a context manager timing `stage` for the current thread if the profiler is enabled.'''
+
+        if not self.enabled:
+            return self.null_stage
+        return StageTimer(self, stage)
+
+
+    def record_stage(self, thread_name: str, stage: str, duration: float) -> None:
+        '''Adds a measured duration to the statistics (calls, total, maximum) of the stage.'''
+
+        with self.lock:
+            stats: list[float] = self.stages.setdefault((thread_name, stage), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+
+    def _sample_loop(self) -> None:
+        '''Samples the current stack of every other thread, collapsed in the `thread;outer;...;inner` flamegraph format.'''
+
+        own_ident: int = threading.get_ident()
+        while self.enabled:
+            thread_names: dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack: list[str] = []
+                while frame is not None:
+                    stack.append(f'{frame.f_code.co_name} ({Path(frame.f_code.co_filename).name})')
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                with self.lock:
+                    self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+    def collapsed(self) -> str:
+        '''Returns the sampled stacks in collapsed format, one `stack count` per line, as used by flamegraph tools.'''
+
+        with self.lock:
+            return "".join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+    def summary(self, top: int = 10) -> str:
+        '''Returns a table with the stage timings per thread and the functions most often found running in the samples.'''
+
+        with self.lock:
+            stages: list[tuple[tuple[str, str], list[float]]] = sorted(self.stages.items(), key=lambda item: item[1][1], reverse=True)
+            leaves: Counter[str] = Counter()
+            for stack, count in self.samples.items():
+                leaves[f'{stack.split(";")[0]}: {stack.split(";")[-1]}'] += count
+            total_samples: int = sum(self.samples.values())
+
+        elapsed: float = time.perf_counter() - self.started if self.started else 0.0
+        lines: list[str] = [f'Profiled for {elapsed:.1f} s, {total_samples} samples.', "",
+                            f'{"Thread":<14}{"Stage":<12}{"Calls":>8}{"Total s":>10}{"Mean ms":>10}{"Max ms":>10}']
+        for (thread_name, stage), (calls, total, maximum) in stages:
+            lines.append(f'{thread_name:<14}{stage:<12}{int(calls):>8}{total:>10.2f}{total / calls * 1000:>10.2f}{maximum * 1000:>10.2f}')
+
+        lines.extend(["", f'{"Samples":>8}  Thread: function'])
+        for leaf, count in leaves.most_common(top):
+            lines.append(f'{count:>8}  {leaf}')
+        return "\n".join(lines)
+
+
+    def dump(self, directory_path: Path) -> tuple[Path, Path]:
+        '''Writes the collapsed stacks and the summary table to `profile-{timestamp}` files and returns their paths.'''
+
+        timestamp: int = int(datetime.datetime.now().timestamp())
+        collapsed_path: Path = directory_path / f'profile-{timestamp}.collapsed'
+        summary_path: Path = directory_path / f'profile-{timestamp}.txt'
+        collapsed_path.write_text(self.collapsed())
+        summary_path.write_text(self.summary())
+        return collapsed_path, summary_path
+
+
+PROFILER: Profiler = Profiler()
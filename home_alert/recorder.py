@@ -1,25 +1,53 @@
 from collections import deque
 import datetime
 import logging
+import os
 from pathlib import Path
 import time
 
 import cv2
 
 from .configuration import Config
+from .live_view import FrameBroadcaster
+from .pacing import FramePacer
+from .profiler import PROFILER
+from .staging import SegmentStager
+from .summary import MotionSummary, SUMMARY_MAX_SIZE, SUMMARY_MIN_SECONDS
+from .supervisor import CameraSupervisor
+
+
+#  Initial estimate of the mp4v output size per recorded pixel in chunked mode. OpenCV's mp4v writer targets about
+#  one bit per pixel, noisy scenes (e.g. low light) go above it, so later chunks are sized from the observed rate.
+MP4V_BYTES_PER_PIXEL: float = 0.125
+#  Margin over the estimated chunk size, so chunks are not closed early by normal bitrate variation.
+CHUNK_SIZE_MARGIN: float = 1.5
 
 
 class Recorder:
 
-    def __init__(self, cam: int, config: Config, recording_dir_path: Path, recordings_queue: deque[str]) -> None:
+    def __init__(self, cam: int, config: Config, recording_dir_path: Path, recordings_queue: deque[str],
+                 stager: SegmentStager|None = None, broadcaster: FrameBroadcaster|None = None, 
+                 supervisor: CameraSupervisor|None = None) -> None:
         '''Recorder Class that represents the video recording component of the application.'''
 
         self.cam: int = cam
         self.config: Config = config
         self.recording_dir_path: Path = recording_dir_path
         self.recordings_queue: deque[str] = recordings_queue
+        self.stager: SegmentStager|None = stager
+        self.broadcaster: FrameBroadcaster|None = broadcaster
+        self.supervisor: CameraSupervisor = supervisor if supervisor is not None else CameraSupervisor(cam, config)
         self.rec_filepath: Path|None = None
         self.rec: Path|None = None
+        self.pacer: FramePacer|None = None
+        self.last_frame: cv2.typing.MatLike|None = None
+        self.summary: MotionSummary|None = None
+        self.event_summaries: int = 0
+        self.segment_started: float = 0.0
+        self.segment_max_size: int = config.max_file_size_mb * 1000000
+        self.chunk_byte_rate: float|None = None
+        self.previous_segments: dict[str, tuple[str, int]] = {}
+        self.manifest_path: Path|None = None
         self.logger: logging.Logger = logging.getLogger(__name__)
         self.bad_frames_counter: int = 5
 
@@ -36,14 +64,162 @@ class Recorder:
 
 
     def _make_recorder(self) -> None:
-        '''Creates and returns a Video Writer object for the recorder component.'''
+        '''Creates and returns a Video Writer object for the recorder component, with a new frame pacer for the segment.'''
 
+        frame_rate: float = self.cap.get(cv2.CAP_PROP_FPS) or self.config.recorder_frame_rate
         self.rec: cv2.VideoWriter = cv2.VideoWriter(
             str(self.rec_filepath), 
             fourcc=cv2.VideoWriter_fourcc(*'mp4v'),
-            fps=self.cap.get(cv2.CAP_PROP_FPS), 
+            fps=frame_rate, 
             frameSize=(int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
         )
+        self.pacer = FramePacer(frame_rate) if self.config.recorder_pacing else None
+        self.last_frame = None
+        self.segment_started = time.monotonic()
+
+
+    def _segment_max_size(self) -> int:
+        '''Returns the size in bytes after which a new segment is started. In chunked mode, this is the estimated size
+        of a chunk (capped at `max_file_size_mb`), so chunks only reserve what they need from the staging budget.
+        The estimate is based on the bytes per second of the previous chunk, or on the writer bitrate for the first one.
+        '''
+
+        max_size: int = self.config.max_file_size_mb * 1000000
+        if self.config.chunk_seconds:
+            byte_rate: float|None = self.chunk_byte_rate
+            if byte_rate is None:
+                frame_rate: float = self.cap.get(cv2.CAP_PROP_FPS) or self.config.recorder_frame_rate
+                width: float = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH) or self.config.recorder_frame_width
+                height: float = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or self.config.recorder_frame_height
+                byte_rate = width * height * frame_rate * MP4V_BYTES_PER_PIXEL
+            max_size = min(max_size, int(byte_rate * self.config.chunk_seconds * CHUNK_SIZE_MARGIN))
+        return max_size
+
+
+    def _segment_path(self, cur_timestamp: float, max_size: int, suffix: str = "") -> Path:
+        '''Returns the path for a new recording segment of up to `max_size` bytes, staged in memory if a stager is available.'''
+
+        #  Segments of the same kind started within the same second as the previous one (e.g. a chunk closed early)
+        #  get a counter after the timestamp, so they do not overwrite it.
+        base: str = f'{self.cam}-{int(cur_timestamp)}'
+        previous_base, count = self.previous_segments.get(suffix, ("", 0))
+        count = count + 1 if base == previous_base else 0
+        self.previous_segments[suffix] = (base, count)
+        filename: str = f'{base}-{count}{suffix}.mp4' if count else f'{base}{suffix}.mp4'
+        if self.stager is not None:
+            #  10% margin for the frames written after the last filesize check.
+            return self.stager.segment_path(filename, int(max_size * 1.1))
+        return self.recording_dir_path / filename
+
+
+    def _new_segment(self, cur_timestamp: float) -> None:
+        '''Starts a new recording segment. In chunked mode, the manifest of the event is created with its first chunk.'''
+
+        self.segment_max_size = self._segment_max_size()
+        self.rec_filepath: Path = self._segment_path(cur_timestamp, self.segment_max_size)
+        self._make_recorder()
+        if self.config.chunk_seconds and self.manifest_path is None:
+            self._open_event_manifest()
+
+
+    def _queue_segment(self) -> None:
+        '''Releases the Video Writer object, if any, and queues the finished segment for upload.
+        In chunked mode, the segment is also appended to the manifest of the current event.
+        '''
+
+        if self.rec is not None:
+            self.rec.release()
+            duration: float = time.monotonic() - self.segment_started
+            if self.config.chunk_seconds and duration > 0:
+                self.chunk_byte_rate = self.rec_filepath.stat().st_size / duration
+        if self.rec_filepath is not None:
+            self.recordings_queue.append(self.rec_filepath.name)
+            if self.manifest_path is not None:
+                #  The chunk is synced before it is listed, so the manifest never lists data lost in a power failure.
+                with open(self.rec_filepath, "r+b") as f:
+                    os.fsync(f.fileno())
+                with open(self.manifest_path, "a") as f:
+                    f.write(f'{self.rec_filepath.name}\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+
+
+    def _finalize_segment(self) -> None:
+        '''Queues the current segment for upload and resets the segment state.'''
+
+        self._queue_segment()
+        self.rec_filepath = None
+        self.rec = None
+        self.pacer = None
+        self.last_frame = None
+
+
+    def _make_summary(self, cur_timestamp: float) -> None:
+        '''Creates the motion summary for the current event.'''
+
+        frame_size: tuple[int, int] = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.summary = MotionSummary(self.config, self._segment_path(cur_timestamp, SUMMARY_MAX_SIZE, "-summary"), frame_size)
+
+
+    def _finalize_summary(self) -> None:
+        '''Finishes the motion summary, if any, and queues it ahead of the segments waiting for upload.
+        Summaries without any frames are removed.
+        '''
+
+        if self.summary is None:
+            return
+
+        filepath: Path = self.summary.filepath
+        if self.summary.release():
+            self.recordings_queue.appendleft(filepath.name)
+            self.event_summaries += 1
+        else:
+            filepath.unlink(missing_ok=True)
+            if self.stager is not None:
+                self.stager.discard(filepath.name)
+        self.summary = None
+
+
+    def _rollover_summary(self) -> None:
+        '''Queues the motion summary of the event so far at a segment rollover, ahead of the segment just queued, if it has frames.
+        The first summary of an event is queued at the first rollover, so it is uploaded before the rest of the segments,
+        later ones only once they cover at least `SUMMARY_MIN_SECONDS`. A new summary is started with the next frame.
+        '''
+
+        if self.summary is None or not self.summary.written:
+            return
+        if not self.event_summaries or time.monotonic() - self.summary.started >= SUMMARY_MIN_SECONDS:
+            self._finalize_summary()
+
+
+    def _open_event_manifest(self) -> None:
+        '''Creates the manifest of the event, `events/camera id-timestamp.chunks`, named after its first chunk.
+        Every finished chunk is appended to it right away, so the chunks recorded before a crash can still be
+        stitched into a single file with `python main.py --stitch`.
+        '''
+
+        events_dir_path: Path = self.recording_dir_path / "events"
+        events_dir_path.mkdir(exist_ok=True)
+        self.manifest_path = events_dir_path / f'{self.rec_filepath.stem}.chunks'
+        self.manifest_path.touch()
+
+
+    def _stop_recording(self) -> None:
+        '''Releases the capture and finalizes the current segment once the recording has been stopped.'''
+
+        self.cap.release()
+        self._finalize_segment()
+        self._finalize_summary()
+        self.event_summaries = 0
+        self.manifest_path = None
+        self.count = 0
+        if self.config.debug:
+            try:
+                cv2.destroyWindow(f'cap-{self.cam}')
+            except cv2.error:
+                pass
+            print(f'Camera {self.cam} stopping recording. Detecting active.')
+        self.logger.info(f'Camera {self.cam} stoping recording. Detecting active.')
 
 
     def _recorder_loop(self) -> None:
@@ -51,68 +227,97 @@ class Recorder:
 
         while True:
             if self.config.kill:
-                if self.rec_filepath is not None:
-                    self.recordings_queue.append(self.rec_filepath.name)
+                #  Release the Video Writer before queueing, so the last segment is a complete file.
+                self._finalize_segment()
+                self._finalize_summary()
+                self.manifest_path = None
                 break
             if not self.config.recording:
+                if self.rec is not None or self.summary is not None or self.manifest_path is not None:
+                    #  Recording stopped while the camera was not responding, so no frame reached the stop check below.
+                    #  Finish the event now, otherwise the next alert would continue its summary and manifest.
+                    self._stop_recording()
+                time.sleep(0.1)
+                continue
+            if not self.supervisor.can_reconnect():
                 time.sleep(0.1)
                 continue
             if not self.cap.isOpened():
                 self._make_rec_capture()
             
-            ret, frame = self.cap.read()
+            with PROFILER.stage("capture"):
+                ret, frame = self.cap.read()
             if not ret:
                 if self.config.debug:
                     print(f'Recorder {self.cam}: No frame received!')
                 if self.bad_frames_counter <= 0:
                     self.logger.error(f'Recorder {self.cam}: No frames received.')
-                    self.config.kill = True
+                    #  Keep what was recorded so far, a new segment is started once the camera reconnects.
+                    self._finalize_segment()
+                    self.cap.release()
+                    self.bad_frames_counter = 5
+                    self.supervisor.connection_lost(f'Recorder {self.cam}')
                 else:
                     self.bad_frames_counter -= 1
                 continue
             elif ret and self.bad_frames_counter < 5:
                 self.bad_frames_counter += 1
+            self.supervisor.connection_restored(f'Recorder {self.cam}')
+            capture_time: float = time.monotonic()
             
             cur_date: datetime.datetime = datetime.datetime.now()
             cur_timestamp: float = cur_date.timestamp()
-            cur_date_str: str = cur_date.strftime("%Y/%m/%d %H:%M:%S.%f")[:-3]
-            cv2.putText(frame, cur_date_str, (20, 20), cv2.FONT_HERSHEY_PLAIN, 1.5, (255,255,255), 1, cv2.LINE_AA)
             
             if self.rec is None:
-                filename: str = f'{self.cam}-{int(cur_timestamp)}.mp4'
-                self.rec_filepath: Path = self.recording_dir_path / filename
-                self._make_recorder()
+                self._new_segment(cur_timestamp)
 
             #  Checking max filesize for uploading restrictions. Not exact convertion to bytes to leave some margin.
-            if self.rec_filepath.stat().st_size > (self.config.max_file_size_mb * 1000000):
-                self.recordings_queue.append(self.rec_filepath.name)
-                filename: str = f'{self.cam}-{int(cur_timestamp)}.mp4'
-                self.rec_filepath: Path = self.recording_dir_path / filename
-                self.rec.release()
-                self._make_recorder()
-            
-            self.rec.write(frame)
-            self.count += 1
+            #  In chunked mode, segments are also closed after `chunk_seconds`, so each finished chunk is a readable file uploaded right away.
+            #  Chunks growing past their estimated size (e.g. the scene suddenly getting noisier) are closed early,
+            #  so they stay within their staging reservation. The next chunk is sized from the observed rate.
+            if (self.rec_filepath.stat().st_size > self.segment_max_size 
+                or (self.config.chunk_seconds and capture_time - self.segment_started >= self.config.chunk_seconds)):
+                self._queue_segment()
+                self._rollover_summary()
+                self._new_segment(cur_timestamp)
+
+            #  Frames captured faster than the output frame rate are dropped before any overlay or encoding work.
+            frames_due: int = self.pacer.frames_due(capture_time) if self.pacer is not None else 1
+            if frames_due == 0:
+                if not self.config.recording:
+                    self._stop_recording()
+                continue
+
+            if self.config.summary:
+                with PROFILER.stage("summary"):
+                    if self.summary is not None and self.summary.filepath.stat().st_size > SUMMARY_MAX_SIZE:
+                        self._finalize_summary()
+                    if self.summary is None:
+                        self._make_summary(cur_timestamp)
+                    self.summary.add(frame, cur_date)
+
+            with PROFILER.stage("overlay"):
+                cur_date_str: str = cur_date.strftime("%Y/%m/%d %H:%M:%S.%f")[:-3]
+                cv2.putText(frame, cur_date_str, (20, 20), cv2.FONT_HERSHEY_PLAIN, 1.5, (255,255,255), 1, cv2.LINE_AA)
+
+            if self.broadcaster is not None:
+                with PROFILER.stage("live_view"):
+                    self.broadcaster.publish(frame)
+
+            with PROFILER.stage("encode"):
+                #  Fill the gap since the previous frame by repeating it, so the segment keeps a constant frame rate.
+                for _ in range(frames_due - 1):
+                    self.rec.write(self.last_frame if self.last_frame is not None else frame)
+                self.rec.write(frame)
+            self.last_frame = frame
+            self.count += frames_due
 
             if self.config.debug:
                 cv2.imshow(f'cap-{self.cam}', frame)
                 cv2.waitKey(1)
 
             if not self.config.recording:
-                self.cap.release()
-                self.rec.release()
-                if self.rec_filepath is not None:
-                    self.recordings_queue.append(self.rec_filepath.name)
-                self.rec_filepath =  None
-                self.rec = None
-                self.count = 0
-                if self.config.debug:
-                    try:
-                        cv2.destroyWindow(f'cap-{self.cam}')
-                    except cv2.error:
-                        pass
-                    print(f'Camera {self.cam} stopping recording. Detecting active.')
-                self.logger.info(f'Camera {self.cam} stoping recording. Detecting active.')
+                self._stop_recording()
 
 
     def record(self) -> None:
@@ -0,0 +1,84 @@
+import logging
+from pathlib import Path
+import shutil
+import threading
+
+
+class SegmentStager:
+
+    def __init__(self, staging_dir_path: Path, budget_mb: int, recording_dir_path: Path) -> None:
+        '''SegmentStager Class that keeps recording segments in a memory backed directory (e.g. tmpfs) until they are uploaded,
+        within a hard memory budget. Segments that do not fit in the budget are written to the `recordings` directory as usual.
+        '''
+
+        self.staging_dir_path: Path = staging_dir_path
+        self.recording_dir_path: Path = recording_dir_path
+        self.budget: int = budget_mb * 1000000
+        self.reserved: dict[str, int] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.logger: logging.Logger = logging.getLogger(__name__)
+
+        self.staging_dir_path.mkdir(parents=True, exist_ok=True)
+
+
+    def segment_path(self, filename: str, max_size: int) -> Path:
+        '''Returns the path a new segment should be written to. The segment is staged in memory if `max_size` bytes
+        can be reserved within the budget, otherwise it is written directly to the `recordings` directory.
+        '''
+
+        with self.lock:
+            if sum(self.reserved.values()) + max_size <= self.budget:
+                self.reserved[filename] = max_size
+                return self.staging_dir_path / filename
+
+        self.logger.warning(f'Staging budget exhausted, writing {filename} to durable storage.')
+        return self.recording_dir_path / filename
+
+
+    def is_staged(self, filename: str) -> bool:
+        '''Returns whether the segment is currently held in the staging directory.'''
+
+        with self.lock:
+            return filename in self.reserved
+
+
+    def locate(self, filename: str) -> Path:
+        '''Returns the current path of the segment, staged or durable.'''
+
+        if self.is_staged(filename):
+            return self.staging_dir_path / filename
+        return self.recording_dir_path / filename
+
+
+    def persist(self, filename: str, destination_dir_path: Path) -> Path:
+        '''Moves a staged segment to `destination_dir_path` on durable storage and releases its reservation.
+        Blocking, meant to be run outside the bot event loop.
+        '''
+
+        destination: Path = destination_dir_path / filename
+        shutil.move(self.staging_dir_path / filename, destination)
+        with self.lock:
+            self.reserved.pop(filename, None)
+        return destination
+
+
+    def discard(self, filename: str) -> None:
+        '''Releases the reservation of a staged segment that was removed without being uploaded.'''
+
+        with self.lock:
+            self.reserved.pop(filename, None)
+
+
+    def flush(self) -> None:
+        '''Moves all remaining staged segments to the `recordings` directory. Used on application shutdown.'''
+
+        with self.lock:
+            filenames: list[str] = list(self.reserved)
+
+        for filename in filenames:
+            if (self.staging_dir_path / filename).exists():
+                self.persist(filename, self.recording_dir_path)
+                self.logger.info(f'Staged segment {filename} persisted to durable storage.')
+            else:
+                with self.lock:
+                    self.reserved.pop(filename, None)
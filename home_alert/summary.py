@@ -0,0 +1,71 @@
+import datetime
+from pathlib import Path
+import time
+
+import cv2
+
+from .configuration import Config
+
+
+#  Least seconds a summary after the first one of an event covers before it is queued at a segment rollover,
+#  so short chunks do not each get their own summary.
+SUMMARY_MIN_SECONDS: float = 30.0
+#  Size in bytes after which a new summary file is started, also used as its staging reservation.
+SUMMARY_MAX_SIZE: int = 5000000
+
+
+class MotionSummary:
+
+    def __init__(self, config: Config, filepath: Path, frame_size: tuple[int, int]) -> None:
+        '''MotionSummary Class that builds a short, reduced resolution timelapse of an event while it is being recorded.
+        Only frames with a motion score of at least `summary_motion_threshold` are kept, one every `summary_frame_step`.
+        '''
+
+        self.config: Config = config
+        self.filepath: Path = filepath
+        width: int = min(config.summary_frame_width, frame_size[0])
+        #  Even dimensions, as required by most encoders.
+        self.size: tuple[int, int] = (width - width % 2, int(frame_size[1] * width / frame_size[0]) // 2 * 2)
+        self.writer: cv2.VideoWriter = cv2.VideoWriter(
+            str(filepath),
+            fourcc=cv2.VideoWriter_fourcc(*'mp4v'),
+            fps=config.summary_frame_rate,
+            frameSize=self.size
+        )
+        self.started: float = time.monotonic()
+        self.previous_frame: cv2.typing.MatLike|None = None
+        self.motion_frames: int = 0
+        self.written: int = 0
+
+
+    def add(self, frame: cv2.typing.MatLike, cur_date: datetime.datetime) -> None:
+        '''Scores the motion of a captured frame and writes a reduced copy of it to the summary if selected.'''
+
+        small: cv2.typing.MatLike = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray: cv2.typing.MatLike = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (7,7), 0)
+
+        if self.previous_frame is None:
+            self.previous_frame = gray
+            return
+
+        difference: cv2.typing.MatLike = cv2.absdiff(gray, self.previous_frame)
+        score: float = cv2.threshold(difference, self.config.detector_threshold, 255, cv2.THRESH_BINARY)[1].mean()
+        self.previous_frame = gray
+
+        if score < self.config.summary_motion_threshold:
+            return
+        self.motion_frames += 1
+        if (self.motion_frames - 1) % self.config.summary_frame_step:
+            return
+
+        cur_date_str: str = cur_date.strftime("%Y/%m/%d %H:%M:%S")
+        cv2.putText(small, cur_date_str, (5, 15), cv2.FONT_HERSHEY_PLAIN, 1, (255,255,255), 1, cv2.LINE_AA)
+        self.writer.write(small)
+        self.written += 1
+
+
+    def release(self) -> int:
+        '''Finishes the summary file and returns the amount of frames written to it.'''
+
+        self.writer.release()
+        return self.written
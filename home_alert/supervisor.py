@@ -0,0 +1,60 @@
+import logging
+import threading
+import time
+
+from .configuration import Config
+
+
+RECONNECT_BASE_DELAY: float = 1.0
+RECONNECT_MAX_DELAY: float = 60.0
+
+
+class CameraSupervisor:
+
+    def __init__(self, cam: int, config: Config) -> None:
+        '''CameraSupervisor Class that tracks the connection state of a camera shared by its Detector and Recorder components.
+        When the camera stops responding, reconnection attempts are spaced with exponential backoff and the camera is
+        marked as degraded in its configuration, so the other cameras and the Discord bot keep running.
+        '''
+
+        self.cam: int = cam
+        self.config: Config = config
+        self.logger: logging.Logger = logging.getLogger(__name__)
+        self.lock: threading.Lock = threading.Lock()
+        self.next_attempt: float = 0.0
+
+
+    def can_reconnect(self) -> bool:
+        '''Returns whether the camera is connected or the backoff delay for the next reconnection attempt has passed.'''
+
+        return time.monotonic() >= self.next_attempt
+
+
+    def connection_lost(self, component: str) -> None:
+        '''Marks the camera as degraded and schedules the next reconnection attempt.'''
+
+        with self.lock:
+            delay: float = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** self.config.reconnect_attempts)
+            self.next_attempt = time.monotonic() + delay
+            self.config.reconnect_attempts += 1
+            self.config.degraded = True
+
+        if self.config.debug:
+            print(f'{component}: Camera not responding, reconnecting in {delay:.0f} seconds.')
+        self.logger.warning(f'{component}: Camera not responding, reconnection attempt {self.config.reconnect_attempts} in {delay:.0f} seconds.')
+
+
+    def connection_restored(self, component: str) -> None:
+        '''Clears the degraded state once a frame is received again.'''
+
+        if not self.config.degraded:
+            return
+
+        with self.lock:
+            self.config.degraded = False
+            self.config.reconnect_attempts = 0
+            self.next_attempt = 0.0
+
+        if self.config.debug:
+            print(f'{component}: Camera reconnected.')
+        self.logger.info(f'{component}: Camera reconnected.')
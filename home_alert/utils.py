@@ -1,6 +1,9 @@
 import datetime
+import logging
 from pathlib import Path
 
+import cv2
+
 
 def maintain_log(log_path: Path|str, days: int) -> None:
     '''Function to maintain the log file by removing entries older than `days` days.'''
@@ -40,6 +43,47 @@ def maintain_log(log_path: Path|str, days: int) -> None:
     with open(log_path, "w") as f:
         f.write(new_log)
 
+def stitch_chunks(manifest_path: Path, search_dir_paths: list[Path]) -> Path:
+    '''Function to stitch the chunks of an event, listed in its `.chunks` manifest file, into a single video file
+    next to the manifest. Chunks are looked up in `search_dir_paths`, missing or unreadable (e.g. truncated) chunks are skipped.'''
+
+    logger: logging.Logger = logging.getLogger(__name__)
+    output_path: Path = manifest_path.with_suffix(".mp4")
+    writer: cv2.VideoWriter|None = None
+
+    for chunk in manifest_path.read_text().split():
+        chunk_paths: list[Path] = [dir_path / chunk for dir_path in search_dir_paths if (dir_path / chunk).exists()]
+        if not chunk_paths:
+            logger.warning(f'Chunk {chunk} of {manifest_path.name} not found, skipping.')
+            continue
+
+        cap: cv2.VideoCapture = cv2.VideoCapture(str(chunk_paths[0]))
+        frame_rate: float = cap.get(cv2.CAP_PROP_FPS)
+        frame_size: tuple[int, int] = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if not cap.isOpened() or not frame_rate or not all(frame_size):
+            logger.warning(f'Chunk {chunk} of {manifest_path.name} is not readable, skipping.')
+            cap.release()
+            continue
+
+        if writer is None:
+            writer = cv2.VideoWriter(
+                str(output_path),
+                fourcc=cv2.VideoWriter_fourcc(*'mp4v'),
+                fps=frame_rate,
+                frameSize=frame_size
+            )
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(frame)
+        cap.release()
+
+    if writer is None:
+        raise FileNotFoundError(f'No chunks of {manifest_path.name} found.')
+    writer.release()
+    return output_path
+
 DISCORD_HELP = '''# Help:
 `!status                           `: Returns the status of each Detector and Recorder component.
 `!close                            `: Close application.
@@ -49,6 +93,8 @@ DISCORD_HELP = '''# Help:
 `!stop                             `: Stop recording and detecting with all cameras.
 `!setdetectorthreshold camera value`: Set a new detector threshold value for the specified camera.
 `!setalertthreshold camera value   `: Set a new alert threshold value for the specified camera.
+`!calibrate camera seconds [apply] `: Measures the noise of the empty scene for the specified camera and proposes threshold values. Add `apply` to apply them.
 `!checklog lines                   `: Returns lines from the end of the `log file`. Replace `lines` with the amount of lines you need.
+`!profile                          `: Returns the profiler summary and sampled stacks, if the application was started with `--profile`.
 `!clear                            `: Deletes all messages in the `status-control` Discord channel.
 '''
\ No newline at end of file
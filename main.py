@@ -5,11 +5,13 @@ from pathlib import Path
 import threading
 import time
 
-from home_alert import Config, Detector, Recorder, DiscordBot, utils
+from home_alert import (Config, Detector, Recorder, DiscordBot, CameraSupervisor, FrameBroadcaster, LiveViewServer, 
+                        SegmentStager, PROFILER, utils)
 
 
-def component_maker(cameras: int, config_path: Path, recording_dir_path: Path, 
-                    recordings_queue: deque) -> tuple[list[Config], list[Detector], list[Recorder], DiscordBot]:
+def component_maker(cameras: int, config_path: Path, recording_dir_path: Path, recordings_queue: deque,
+                    stager: SegmentStager|None = None, broadcasters: list[FrameBroadcaster]|None = None
+                    ) -> tuple[list[Config], list[Detector], list[Recorder], DiscordBot]:
     '''Creates and returns the components and configuration objects required for the application.'''
 
     configs: list[Config] = []
@@ -20,13 +22,16 @@ def component_maker(cameras: int, config_path: Path, recording_dir_path: Path,
         config: Config = Config(config_path, cam)
         configs.append(config)
 
-        detector: Detector = Detector(cam, config)
+        broadcaster: FrameBroadcaster|None = broadcasters[cam] if broadcasters is not None else None
+        supervisor: CameraSupervisor = CameraSupervisor(cam, config)
+
+        detector: Detector = Detector(cam, config, broadcaster, supervisor)
         detectors.append(detector)
         
-        recorder: Recorder = Recorder(cam, config, recording_dir_path, recordings_queue)
+        recorder: Recorder = Recorder(cam, config, recording_dir_path, recordings_queue, stager, broadcaster, supervisor)
         recorders.append(recorder)
 
-    discord_bot: DiscordBot = DiscordBot(recording_dir_path, cameras, configs, recordings_queue)
+    discord_bot: DiscordBot = DiscordBot(recording_dir_path, cameras, configs, recordings_queue, stager)
 
     return configs, detectors, recorders, discord_bot
 
@@ -38,13 +43,13 @@ def thread_maker(detectors: list[Detector], recorders: list[Recorder], discord_b
 
     for detector, recorder in zip(detectors, recorders):
 
-        detector_thread: threading.Thread = threading.Thread(target=detector.detect)
+        detector_thread: threading.Thread = threading.Thread(target=detector.detect, name=f'detector-{detector.cam}')
         threads.append(detector_thread)
         
-        recorder_thread: threading.Thread = threading.Thread(target=recorder.record)
+        recorder_thread: threading.Thread = threading.Thread(target=recorder.record, name=f'recorder-{recorder.cam}')
         threads.append(recorder_thread)
 
-    bot_thread: threading.Thread = threading.Thread(target=discord_bot.run_bot)
+    bot_thread: threading.Thread = threading.Thread(target=discord_bot.run_bot, name="discord-bot")
     
     threads.append(bot_thread)
 
@@ -94,6 +99,13 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-c", "--cameras", type=int, help="Amount of webcams.", required=False)
+    parser.add_argument("-s", "--staging-dir", type=Path, help="Memory backed directory (e.g. tmpfs) for staging recordings before upload.", required=False)
+    parser.add_argument("--staging-budget", type=int, default=200, help="Maximum memory in megabytes used for staged recordings.", required=False)
+    parser.add_argument("-l", "--live-view-port", type=int, help="Port for the MJPEG live view server.", required=False)
+    parser.add_argument("--live-view-host", type=str, default="127.0.0.1", help="Address the live view server listens on.", required=False)
+    parser.add_argument("--live-view-fps", type=int, default=5, help="Maximum frame rate of the live view.", required=False)
+    parser.add_argument("-p", "--profile", action="store_true", help="Enable the sampling profiler and stage timers.")
+    parser.add_argument("--stitch", type=Path, help="Stitch the chunks listed in an event `.chunks` file into one video and exit.", required=False)
     args = parser.parse_args()
 
     if args.cameras is not None:
@@ -108,6 +120,11 @@ def main():
     recordings_queue: deque[str] = deque()
     log_path: Path = cwd / "home_alert.log"
 
+    if args.stitch is not None:
+        output_path: Path = utils.stitch_chunks(args.stitch, [recording_dir_path, recording_dir_path / "uploaded"])
+        print(f'Event stitched to {output_path}')
+        return
+
     utils.maintain_log(log_path, days=30)
 
     main_logger: logging.Logger = logging.getLogger(__name__)
@@ -117,14 +134,40 @@ def main():
 
     main_logger.info("Starting application.")
 
-    configs, detectors, recorders, discord_bot = component_maker(cameras, config_path, recording_dir_path, recordings_queue)
+    stager: SegmentStager|None = None
+    if args.staging_dir is not None:
+        stager = SegmentStager(args.staging_dir, args.staging_budget, recording_dir_path)
+
+    broadcasters: list[FrameBroadcaster]|None = None
+    live_view_server: LiveViewServer|None = None
+    if args.live_view_port is not None:
+        broadcasters = [FrameBroadcaster(cam, args.live_view_fps) for cam in range(cameras)]
+        live_view_server = LiveViewServer(args.live_view_host, args.live_view_port, broadcasters)
+
+    configs, detectors, recorders, discord_bot = component_maker(cameras, config_path, recording_dir_path, recordings_queue, 
+                                                                 stager, broadcasters)
     threads = thread_maker(detectors, recorders, discord_bot)
 
+    if args.profile:
+        PROFILER.start()
     for thread in threads:
         thread.start()
+    if live_view_server is not None:
+        live_view_server.start()
 
     exit_loop(main_logger, configs, discord_bot, threads)
 
+    if live_view_server is not None:
+        live_view_server.stop()
+
+    if stager is not None:
+        stager.flush()
+
+    if args.profile:
+        PROFILER.stop()
+        collapsed_path, summary_path = PROFILER.dump(cwd)
+        main_logger.info(f'Profile written to {collapsed_path.name} and {summary_path.name}.')
+
 
 if __name__ == "__main__":
     main()
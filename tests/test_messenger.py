@@ -0,0 +1,83 @@
+import asyncio
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from home_alert.messenger import MessageScheduler, Priority
+
+
+class FakeChannel:
+
+    def __init__(self, id: int) -> None:
+        '''Stand-in for a Discord channel, recording the messages sent to it and the event loop time they were sent at.'''
+
+        self.id: int = id
+        self.sent: list[tuple[float, str, object]] = []
+
+    async def send(self, content: str = "", file: object = None) -> str:
+        self.sent.append((asyncio.get_running_loop().time(), content, file))
+        return content
+
+
+def test_coalescing() -> None:
+    '''Messages of the same priority submitted in a burst are sent as one message, files are always sent on their own.'''
+
+    async def scenario() -> FakeChannel:
+        channel: FakeChannel = FakeChannel(1)
+        scheduler: MessageScheduler = MessageScheduler(coalesce_delay=0.05)
+        futures: list[asyncio.Future] = [scheduler.submit(channel, f'message {i}') for i in range(3)]
+        futures.append(scheduler.submit(channel, "recording", file="file"))
+        await asyncio.gather(*futures)
+        scheduler.stop()
+        return channel
+
+    channel: FakeChannel = asyncio.run(scenario())
+    assert [(content, file) for _, content, file in channel.sent] == [("message 0\nmessage 1\nmessage 2", None), ("recording", "file")]
+
+
+def test_alert_before_reply() -> None:
+    '''Alerts queued after replies are still sent first.'''
+
+    async def scenario() -> FakeChannel:
+        channel: FakeChannel = FakeChannel(1)
+        scheduler: MessageScheduler = MessageScheduler(coalesce_delay=0.05)
+        futures: list[asyncio.Future] = [scheduler.submit(channel, "reply", Priority.REPLY),
+                                         scheduler.submit(channel, "chatter", Priority.CHATTER),
+                                         scheduler.submit(channel, "alert", Priority.ALERT)]
+        await asyncio.gather(*futures)
+        scheduler.stop()
+        return channel
+
+    channel: FakeChannel = asyncio.run(scenario())
+    assert [content for _, content, _ in channel.sent] == ["alert", "reply", "chatter"]
+
+
+def test_rate_budget_pacing() -> None:
+    '''A burst larger than the budget is sent at the token refill rate instead of all at once.'''
+
+    rate, per = 2, 0.4
+
+    async def scenario() -> FakeChannel:
+        channel: FakeChannel = FakeChannel(1)
+        scheduler: MessageScheduler = MessageScheduler(rate=rate, per=per, coalesce_delay=0.01)
+        #  Files are never coalesced, so every submission is a separate send.
+        futures: list[asyncio.Future] = [scheduler.submit(channel, str(i), file=i) for i in range(5)]
+        await asyncio.gather(*futures)
+        scheduler.stop()
+        return channel
+
+    channel: FakeChannel = asyncio.run(scenario())
+    times: list[float] = [sent_time for sent_time, _, _ in channel.sent]
+    assert [content for _, content, _ in channel.sent] == ["0", "1", "2", "3", "4"]
+    #  The first `rate` messages use the full bucket, the rest wait for a token each.
+    assert times[1] - times[0] < per / rate / 2
+    for previous, current in zip(times[rate - 1:], times[rate:]):
+        assert current - previous >= per / rate * 0.9
+
+
+if __name__ == "__main__":
+    test_coalescing()
+    test_alert_before_reply()
+    test_rate_budget_pacing()
+    print("All MessageScheduler checks passed.")
@@ -0,0 +1,104 @@
+from collections import deque
+import json
+from pathlib import Path
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from home_alert.configuration import Config
+from home_alert.recorder import Recorder
+
+
+class FakeCapture:
+
+    responding: bool = True
+
+    def __init__(self, cam: int) -> None:
+        '''Stand-in for a webcam, returning noise frames at about 30 fps while `responding` is set and no frames otherwise.'''
+
+        self.opened: bool = True
+
+    def set(self, prop: int, value: float) -> None:
+        pass
+
+    def get(self, prop: int) -> float:
+        return {cv2.CAP_PROP_FPS: 30, cv2.CAP_PROP_FRAME_WIDTH: 160, cv2.CAP_PROP_FRAME_HEIGHT: 120}.get(prop, 0)
+
+    def isOpened(self) -> bool:
+        return self.opened
+
+    def release(self) -> None:
+        self.opened = False
+
+    def read(self) -> tuple[bool, np.ndarray|None]:
+        time.sleep(1 / 30)
+        if not FakeCapture.responding:
+            return False, None
+        return True, np.random.randint(0, 255, (120, 160, 3), dtype=np.uint8)
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline: float = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out waiting for the recorder."
+        time.sleep(0.05)
+
+
+def test_stop_recording_while_degraded() -> None:
+    '''Stopping a recording while the camera is not responding finishes the event, so the next alert starts
+    a new summary and manifest instead of continuing those of the stopped event.
+    '''
+
+    video_capture = cv2.VideoCapture
+    cv2.VideoCapture = FakeCapture
+    FakeCapture.responding = True
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recording_dir_path: Path = Path(temp_dir)
+            config_path: Path = recording_dir_path / "config.json"
+            config_path.write_text(json.dumps({"0": {"debug": False, "chunk_seconds": 1, "summary_motion_threshold": 0}}))
+            config: Config = Config(config_path, 0)
+            recordings_queue: deque[str] = deque()
+            recorder: Recorder = Recorder(0, config, recording_dir_path, recordings_queue)
+            thread: threading.Thread = threading.Thread(target=recorder.record)
+            thread.start()
+
+            try:
+                config.recording = True
+                wait_for(lambda: recorder.manifest_path is not None and len(recordings_queue) >= 1)
+                first_manifest_path: Path = recorder.manifest_path
+
+                FakeCapture.responding = False
+                wait_for(lambda: config.degraded)
+                config.recording = False
+                wait_for(lambda: recorder.manifest_path is None)
+
+                assert recorder.summary is None and recorder.rec is None
+                assert recordings_queue[0].endswith("-summary.mp4")
+                first_manifest: str = first_manifest_path.read_text()
+
+                #  Next alert once the camera responds again.
+                time.sleep(1)
+                FakeCapture.responding = True
+                config.recording = True
+                wait_for(lambda: recorder.manifest_path is not None and not config.degraded)
+                assert recorder.manifest_path != first_manifest_path
+                config.recording = False
+                wait_for(lambda: recorder.manifest_path is None)
+                assert first_manifest_path.read_text() == first_manifest
+            finally:
+                config.kill = True
+                thread.join()
+    finally:
+        cv2.VideoCapture = video_capture
+
+
+if __name__ == "__main__":
+    test_stop_recording_while_degraded()
+    print("All Recorder checks passed.")